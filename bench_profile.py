@@ -0,0 +1,94 @@
+"""Замер /profile: число SQL-запросов и время на один вызов.
+
+Создаёт временную БД, пользователя с текущим уроком и разбором и вызывает
+handlers.profile с подменённым апдейтом. Считает запросы через событие
+before_cursor_execute движка. С --max-queries завершается с кодом 1,
+если запросов на /profile больше допустимого.
+
+    python bench_profile.py --calls 500 --max-queries 1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+
+class FakeMessage:
+    async def reply_text(self, text, reply_markup=None):
+        return None
+
+
+class FakeUpdate:
+    def __init__(self, user):
+        self.effective_user = user
+        self.message = FakeMessage()
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = "bench"
+        self.full_name = "Bench User"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер запросов и времени /profile")
+    parser.add_argument("--calls", type=int, default=500, help="число вызовов /profile")
+    parser.add_argument("--max-queries", type=float, default=None,
+                        help="допустимое число запросов на один /profile")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DB_NAME"] = os.path.join(tmp.name, "bench.db")
+    os.environ.setdefault("ADMIN_ID", "1")
+
+    from sqlalchemy import event
+    from database import Session, User, init_db, get_engine
+    import handlers
+
+    init_db()
+    user_id = 42
+    with Session() as session:
+        session.add(User(id=user_id, username="bench", full_name="Bench User",
+                         current_lesson_id=1, current_song_id=3))
+        session.commit()
+
+    queries = 0
+
+    @event.listens_for(get_engine(), "before_cursor_execute")
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    update = FakeUpdate(FakeUser(user_id))
+
+    async def run(calls):
+        for _ in range(calls):
+            await handlers.profile(update, None)
+
+    # Первый вызов отдельно: первая сессия БД и прогрев пула соединений
+    queries = 0
+    asyncio.run(run(1))
+    cold_queries = queries
+
+    queries = 0
+    started = time.perf_counter()
+    asyncio.run(run(args.calls))
+    elapsed = time.perf_counter() - started
+    per_call = queries / args.calls
+
+    print(f"queries per /profile (cold): {cold_queries}")
+    print(f"queries per /profile (warm): {per_call:.2f}")
+    print(f"time per /profile:           {elapsed / args.calls * 1000:.3f} ms ({args.calls} вызовов)")
+
+    tmp.cleanup()
+    if args.max_queries is not None and max(cold_queries, per_call) > args.max_queries:
+        print(f"FAIL: больше {args.max_queries:g} запросов на /profile")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Замер холодного старта воркера.
+
+Запускает отдельный процесс с `-X importtime`, выполняет bootstrap() и
+прогоняет через Application.process_update настоящий /profile (Bot API
+отвечает офлайн-заглушкой, без сети). Печатает время до обработки первого
+апдейта и самые тяжёлые импорты; с --budget-ms завершается с кодом 1,
+если старт не уложился в бюджет.
+
+    python bench_startup.py --budget-ms 2000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD_SCRIPT = """
+import asyncio, json, os, time
+import main
+from telegram.request import BaseRequest
+
+# Офлайн-ответы Bot API: get_me и отправка сообщений без сети
+class OfflineRequest(BaseRequest):
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if url.endswith("/getMe"):
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif url.endswith("/sendMessage"):
+            result = {"message_id": 2, "date": 0, "chat": {"id": USER_ID, "type": "private"}, "text": "ok"}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+USER_ID = int(os.environ["ADMIN_ID"])
+
+application = main.bootstrap(OfflineRequest())
+bootstrap_done = time.perf_counter()
+
+# Первый реальный апдейт: /profile от существующего пользователя —
+# первая сессия БД, запрос профиля и ответ через Bot API
+from telegram import Update
+update_data = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1, "date": 0, "text": "/profile",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 8}],
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"}
+    }
+}
+
+async def first_update():
+    await application.initialize()
+    await application.process_update(Update.de_json(update_data, application.bot))
+    return time.perf_counter()
+
+first_update_done = asyncio.run(first_update())
+print(f"BOOTSTRAP_MS={(bootstrap_done - main.PROCESS_START) * 1000:.1f}")
+print(f"FIRST_UPDATE_MS={(first_update_done - main.PROCESS_START) * 1000:.1f}")
+"""
+
+
+def parse_importtime(stderr):
+    # Строки вида: "import time:   self [us] | cumulative | imported package"
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports.append((int(cumulative), name.strip()))
+        except ValueError:
+            continue
+    return imports
+
+
+def run_once(db_path):
+    env = dict(os.environ)
+    env["DB_NAME"] = db_path
+    env.setdefault("BOT_TOKEN", "123456:bench")
+    env.setdefault("ADMIN_ID", "1")
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Дочерний процесс завершился с кодом {result.returncode}")
+
+    metrics = {}
+    for line in result.stdout.splitlines():
+        if "=" in line:
+            key, value = line.split("=", 1)
+            metrics[key] = float(value)
+    return metrics, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер холодного старта бота")
+    parser.add_argument("--runs", type=int, default=3, help="число прогонов (по умолчанию 3)")
+    parser.add_argument("--top", type=int, default=10, help="сколько тяжёлых импортов показать")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="бюджет на время до первого апдейта, мс")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        # Первый прогон создаёт и заполняет БД, в замер не идёт
+        run_once(db_path)
+
+        samples = []
+        imports = []
+        for _ in range(args.runs):
+            metrics, imports = run_once(db_path)
+            samples.append(metrics)
+
+    best = min(samples, key=lambda m: m["FIRST_UPDATE_MS"])
+    print(f"bootstrap:          {best['BOOTSTRAP_MS']:.1f} ms")
+    print(f"time to 1st update: {best['FIRST_UPDATE_MS']:.1f} ms (лучший из {args.runs})")
+    print("\nСамые тяжёлые импорты (cumulative):")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None and best["FIRST_UPDATE_MS"] > args.budget_ms:
+        print(f"\nFAIL: {best['FIRST_UPDATE_MS']:.1f} ms > бюджета {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
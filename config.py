@@ -25,4 +25,21 @@ class Config:
     LESSON_REWARD = 10
     SONG_REWARD = 20
     FINAL_LESSON_REWARD = 30
-    COURSE_COMPLETE_REWARD = 50
\ No newline at end of file
+    COURSE_COMPLETE_REWARD = 50
+
+    # Ограничение частоты запросов: ёмкость корзины и пополнение (токенов/сек)
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 5))
+    RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 1))
+    # Окно (сек), в котором повторное нажатие той же кнопки игнорируется
+    CALLBACK_DEDUP_WINDOW = float(os.getenv('CALLBACK_DEDUP_WINDOW', 3))
+
+    # Журнал событий: запись пачками каждые N событий или T миллисекунд
+    EVENT_BATCH_SIZE = int(os.getenv('EVENT_BATCH_SIZE', 50))
+    EVENT_FLUSH_MS = int(os.getenv('EVENT_FLUSH_MS', 500))
+
+    # Локальный архив записей домашних заданий (выключен, если папка не задана)
+    MEDIA_ARCHIVE_DIR = os.getenv('MEDIA_ARCHIVE_DIR')
+    MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', 20 * 1024 * 1024))
+    MEDIA_CHUNK_SIZE = 64 * 1024
+    # Сколько секунд ждём запись после нажатия «Проверить задание»
+    SUBMIT_TIMEOUT = int(os.getenv('SUBMIT_TIMEOUT', 600))
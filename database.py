@@ -1,24 +1,20 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Float
+from sqlalchemy import create_engine, inspect, text, func, Column, Integer, String, Boolean, ForeignKey, Float
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.exc import IntegrityError
 from config import Config
 import logging
-import sys
-if sys.version_info >= (3, 13):
-    print("FATAL ERROR: Python 3.13 is not supported")
-    print("Please use Python 3.11")
-    sys.exit(1)
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 
 Base = declarative_base()
-engine = create_engine(f'sqlite:///{Config.DB_NAME}')
-Session = sessionmaker(bind=engine)
+
+# Движок создаётся лениво при первом обращении (см. get_engine),
+# чтобы импорт модуля не открывал БД
+_engine = None
+Session = sessionmaker()
+
+_catalog = None
 
 
 class User(Base):
@@ -99,17 +95,121 @@ class Assignment(Base):
     type = Column(String)  # 'lesson' или 'song'
     item_id = Column(Integer)
     status = Column(String, default='pending')  # pending/approved/rejected/revision_requested
+    reviewer_id = Column(Integer)  # кому из проверяющих назначено
+    media_type = Column(String)  # video/voice/document
+    media_file_id = Column(String)  # file_id в Telegram — для пересылки без загрузки
+    media_path = Column(String)  # путь в локальном архиве, если включён
+
+
+class Reviewer(Base):
+    __tablename__ = 'reviewers'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    role = Column(String, default='reviewer')  # admin/reviewer
+    course = Column(Integer)  # закреплённый курс; None — любой
+    is_active = Column(Boolean, default=True)
+
+
+class Event(Base):
+    __tablename__ = 'events'
+
+    id = Column(Integer, primary_key=True)
+    ts = Column(Float)
+    type = Column(String)  # lesson_started/song_started/assignment_submitted/...
+    user_id = Column(Integer, index=True)
+    payload = Column(String)  # JSON
+
+
+def pick_reviewer(session, course=None, exclude=()):
+    """Выбирает наименее загруженного проверяющего (по числу pending-заданий).
+
+    Сначала ищем среди закреплённых за курсом, затем среди универсальных,
+    затем среди всех активных. Проверяющие из exclude пропускаются.
+    """
+    pending = func.count(Assignment.id)
+    candidates = session.query(Reviewer.user_id, Reviewer.course, pending).outerjoin(
+        Assignment,
+        (Assignment.reviewer_id == Reviewer.user_id) & (Assignment.status == 'pending')
+    ).filter(Reviewer.is_active.is_(True)).group_by(Reviewer.user_id).order_by(pending, Reviewer.user_id).all()
+
+    for matches in (lambda c: c == course, lambda c: c is None, lambda c: True):
+        for user_id, reviewer_course, _ in candidates:
+            if user_id not in exclude and matches(reviewer_course):
+                return user_id
+    return None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine(f'sqlite:///{Config.DB_NAME}')
+        Session.configure(bind=_engine)
+    return _engine
+
+
+class Catalog:
+    """Справочник уроков и разборов (id -> название), читается из БД один раз"""
+
+    def __init__(self, lessons, songs):
+        self.lessons = lessons
+        self.songs = songs
+
+    def lesson_title(self, lesson_id):
+        return self.lessons.get(lesson_id)
+
+    def song_title(self, song_id):
+        return self.songs.get(song_id)
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        get_engine()
+        with Session() as session:
+            lessons = dict(session.query(Lesson.id, Lesson.title).all())
+            songs = dict(session.query(Song.id, Song.title).all())
+        _catalog = Catalog(lessons, songs)
+        logger.info(f"Справочник загружен: {len(lessons)} уроков, {len(songs)} разборов")
+    return _catalog
+
+
+def migrate_columns(engine):
+    # create_all не добавляет новые колонки в существующие таблицы — досоздаём их
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    logger.info(f"Добавлена колонка {table.name}.{column.name}")
 
 
 def init_db():
+    global _catalog
+    session = None
     try:
+        engine = get_engine()
         Base.metadata.create_all(engine)
+        migrate_columns(engine)
         logger.info("Таблицы базы данных созданы")
 
         session = Session()
+        admin_id = Config.ADMIN_ID
+
+        # Одним запросом проверяем, нужно ли заполнять справочники и создавать админа
+        has_lessons, has_songs, has_admin, has_admin_reviewer = session.query(
+            session.query(Lesson.id).exists(),
+            session.query(Song.id).exists(),
+            session.query(User.id).filter_by(id=admin_id).exists(),
+            session.query(Reviewer.user_id).filter_by(user_id=admin_id).exists()
+        ).one()
 
         # Проверяем, есть ли уже уроки в базе
-        if session.query(Lesson).count() == 0:
+        if not has_lessons:
             logger.info("Добавляем уроки в базу данных...")
 
             # Курс 1: Основы фингерстайла (20 уроков)
@@ -217,7 +317,7 @@ def init_db():
             logger.info(f"Добавлено {len(course1_lessons) + len(course2_lessons) + len(course3_lessons)} уроков")
 
         # Проверяем песни
-        if session.query(Song).count() == 0:
+        if not has_songs:
             logger.info("Добавляем песни в базу данных...")
             songs = [
                 (1, "Billie Jean"),
@@ -245,8 +345,7 @@ def init_db():
             logger.info(f"Добавлено {len(songs)} песен")
 
         # Проверяем наличие админ-пользователя
-        admin_id = Config.ADMIN_ID
-        if not session.query(User).get(admin_id):
+        if not has_admin:
             logger.info("Создаем администратора...")
             admin = User(
                 id=admin_id,
@@ -259,23 +358,39 @@ def init_db():
             session.add(admin)
             logger.info(f"Администратор с ID {admin_id} создан")
 
+        # Администратор из конфига — первый участник пула проверяющих
+        if not has_admin_reviewer:
+            session.add(Reviewer(user_id=admin_id, role='admin'))
+            logger.info(f"Администратор {admin_id} добавлен в пул проверяющих")
+
         session.commit()
+        # Справочник мог измениться — перечитаем при следующем обращении
+        if not has_lessons or not has_songs:
+            _catalog = None
         logger.info("База данных успешно инициализирована")
 
     except IntegrityError as e:
-        session.rollback()
+        if session is not None:
+            session.rollback()
         logger.error(f"Ошибка целостности данных: {str(e)}")
     except Exception as e:
-        session.rollback()
+        if session is not None:
+            session.rollback()
         logger.error(f"Ошибка при инициализации БД: {str(e)}")
     finally:
-        session.close()
+        if session is not None:
+            session.close()
 
 
 def get_session():
+    get_engine()
     return Session()
 
 
 # Для тестирования: если файл запущен напрямую, инициализируем БД
 if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
     init_db()
@@ -0,0 +1,112 @@
+from sqlalchemy import insert
+from database import Session, Event, get_engine
+from config import Config
+import metrics
+import json
+import logging
+import queue
+import threading
+import time
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Повторы записи пачки: экспоненциальная пауза от RETRY_DELAY до RETRY_MAX_DELAY сек.
+# После stop() на все оставшиеся пачки даётся SHUTDOWN_ATTEMPTS неудачных попыток
+# в сумме, чтобы остановка не зависла при недоступной БД
+RETRY_DELAY = 0.1
+RETRY_MAX_DELAY = 5
+SHUTDOWN_ATTEMPTS = 3
+
+
+class EventLog:
+    """Append-only журнал событий с фоновой записью пачками.
+
+    emit() только кладёт событие в очередь и не ждёт БД; поток-писатель
+    сбрасывает накопленное каждые batch_size событий или flush_ms миллисекунд.
+    Неудачная запись (например, «database is locked») повторяется с паузой,
+    пачка при этом не теряется, а новые события копятся в очереди.
+    """
+
+    def __init__(self, batch_size, flush_ms):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.queue = queue.Queue()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.shutdown_attempts_left = SHUTDOWN_ATTEMPTS
+
+    def start(self):
+        if self.thread is None:
+            get_engine()
+            self.thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        # Дописываем всё, что осталось в очереди; зависший повтор записи
+        # увидит stopping и перейдёт на ограниченное число попыток
+        if self.thread is not None:
+            self.stopping.set()
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def emit(self, event_type, user_id, **payload):
+        self.queue.put({
+            "ts": time.time(),
+            "type": event_type,
+            "user_id": user_id,
+            "payload": json.dumps(payload, ensure_ascii=False)
+        })
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch):
+        delay = RETRY_DELAY
+        while True:
+            if self.stopping.is_set() and self.shutdown_attempts_left <= 0:
+                metrics.inc("events_dropped", len(batch))
+                logger.error(f"Dropping {len(batch)} events on shutdown: database is unavailable")
+                return
+            try:
+                with Session() as session:
+                    session.execute(insert(Event), batch)
+                    session.commit()
+                metrics.inc("events_written", len(batch))
+                return
+            except Exception as e:
+                if self.stopping.is_set():
+                    self.shutdown_attempts_left -= 1
+                # Только ошибка драйвера, без SQL и параметров всей пачки
+                reason = str(getattr(e, "orig", None) or e)
+                metrics.inc("events_flush_retries")
+                logger.warning(f"Error writing {len(batch)} events, retry in {delay:.1f}s: {reason}")
+                # Пауза прерывается сразу после stop(); при остановке попытки идут без пауз
+                self.stopping.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+
+event_log = EventLog(Config.EVENT_BATCH_SIZE, Config.EVENT_FLUSH_MS)
@@ -1,7 +1,10 @@
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from database import Session, User, Lesson, Song, Assignment, CompletedLesson, CompletedSong
-from keyboards import profile_keyboard, song_selection_keyboard, admin_review_keyboard
+from telegram.error import BadRequest, Forbidden
+from database import Session, User, Lesson, Song, Assignment, CompletedLesson, CompletedSong, Reviewer, get_catalog, pick_reviewer
+from keyboards import profile_keyboard, song_selection_keyboard, admin_review_keyboard, media_prompt_keyboard
+from media import Media, extract_media, send_media, archive_media
+from events import event_log
 from config import Config
 import logging
 
@@ -10,6 +13,26 @@ logger = logging.getLogger(__name__)
 
 # Состояния для ConversationHandler
 SELECTING_SONG = 1
+WAITING_MEDIA = 2
+
+ALREADY_PENDING_TEXT = "⏳ Это задание уже на проверке! Дождитесь ответа проверяющего."
+
+def get_active_reviewer(session, user_id):
+    reviewer = session.get(Reviewer, user_id)
+    return reviewer if reviewer and reviewer.is_active else None
+
+def find_pending_assignment(session, db_user):
+    # Задание по текущему уроку/разбору, которое уже ждёт проверки
+    return session.query(Assignment).filter_by(
+        user_id=db_user.id,
+        type="lesson" if db_user.current_lesson_id else "song",
+        item_id=db_user.current_lesson_id or db_user.current_song_id,
+        status="pending"
+    ).first()
+
+def can_review(reviewer, assignment):
+    # Админ может проверить любое задание, проверяющий — только назначенное ему
+    return reviewer.role == "admin" or assignment.reviewer_id in (None, reviewer.user_id)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -25,6 +48,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             session.add(db_user)
             session.commit()
             logger.info(f"New user created: {user.id}")
+            event_log.emit("user_created", user.id, username=user.username, full_name=user.full_name)
 
         await update.message.reply_text(
             f"Привет, {user.full_name}! Добро пожаловать в Антимузыкалку!",
@@ -37,32 +61,37 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     with Session() as session:
-        db_user = session.query(User).filter_by(id=user.id).first()
-
-        if not db_user:
-            await start(update, context)
-            return
+        # Профиль вместе с названиями текущего урока и разбора — одним запросом
+        row = session.query(
+            User.full_name, User.rank, User.reputation, User.current_course, User.progress,
+            User.current_lesson_id, User.current_song_id,
+            Lesson.title.label("lesson_title"), Song.title.label("song_title")
+        ).outerjoin(Lesson, Lesson.id == User.current_lesson_id).outerjoin(
+            Song, Song.id == User.current_song_id
+        ).filter(User.id == user.id).first()
+
+    if not row:
+        await start(update, context)
+        return
 
-        # Формируем текст профиля
-        profile_text = (
-            f"{db_user.full_name} | Звание: {db_user.rank} (✨{db_user.reputation})\n"
-            f"---\n"
-            f"Курс: {db_user.current_course} | Прогресс: {db_user.progress:.1f}%\n"
-        )
+    # Формируем текст профиля
+    profile_text = (
+        f"{row.full_name} | Звание: {row.rank} (✨{row.reputation})\n"
+        f"---\n"
+        f"Курс: {row.current_course} | Прогресс: {row.progress:.1f}%\n"
+    )
 
-        if db_user.current_lesson_id:
-            lesson = session.get(Lesson, db_user.current_lesson_id)
-            profile_text += f"Текущий урок: {lesson.title}\n" if lesson else "Текущий урок: Неизвестный урок\n"
+    if row.current_lesson_id:
+        profile_text += f"Текущий урок: {row.lesson_title or 'Неизвестный урок'}\n"
 
-        if db_user.current_song_id:
-            song = session.get(Song, db_user.current_song_id)
-            profile_text += f"Текущий разбор: {song.title}\n" if song else "Текущий разбор: Неизвестный разбор\n"
+    if row.current_song_id:
+        profile_text += f"Текущий разбор: {row.song_title or 'Неизвестный разбор'}\n"
 
-        await update.message.reply_text(
-            profile_text,
-            reply_markup=profile_keyboard(db_user)
-        )
-        logger.info(f"Profile viewed by user: {user.id}")
+    await update.message.reply_text(
+        profile_text,
+        reply_markup=profile_keyboard(row)
+    )
+    logger.info(f"Profile viewed by user: {user.id}")
 
     return ConversationHandler.END
 
@@ -95,6 +124,7 @@ async def start_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE):
         db_user.current_lesson_id = next_lesson.id
         session.commit()
         logger.info(f"Lesson started: user={user.id}, lesson={next_lesson.id}")
+        event_log.emit("lesson_started", user.id, lesson_id=next_lesson.id)
 
         await query.edit_message_text(
             f"✅ Начат урок: {next_lesson.title}\n\n"
@@ -160,6 +190,7 @@ async def select_song(update: Update, context: ContextTypes.DEFAULT_TYPE):
         db_user.current_song_id = song_id
         session.commit()
         logger.info(f"Song started: user={user.id}, song={song_id}")
+        event_log.emit("song_started", user.id, song_id=song_id)
 
         await query.edit_message_text(
             f"✅ Начат разбор: {song.title}\n\n"
@@ -185,64 +216,197 @@ async def submit_assignment(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ У вас нет активных заданий!")
             return ConversationHandler.END
 
+        if find_pending_assignment(session, db_user):
+            await query.edit_message_text(ALREADY_PENDING_TEXT)
+            return ConversationHandler.END
+
+    await query.edit_message_text(
+        "📎 Пришлите видео, голосовое сообщение или файл с записью вашей игры.",
+        reply_markup=media_prompt_keyboard()
+    )
+    return WAITING_MEDIA
+
+async def receive_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    media = extract_media(update.message)
+    if not media:
+        await update.message.reply_text("❌ Нужно видео, голосовое сообщение или файл!")
+        return WAITING_MEDIA
+
+    await create_assignment(update, context, update.message.reply_text, media)
+    return ConversationHandler.END
+
+async def submit_without_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await create_assignment(update, context, query.edit_message_text)
+    return ConversationHandler.END
+
+async def cancel_submit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text("Отправка задания отменена")
+    return ConversationHandler.END
+
+def review_text(assignment, db_user):
+    item_type = "урок" if assignment.type == "lesson" else "разбор"
+    catalog = get_catalog()
+    if assignment.type == "lesson":
+        item_name = catalog.lesson_title(assignment.item_id)
+    else:
+        item_name = catalog.song_title(assignment.item_id)
+
+    item_name = item_name or "Неизвестное задание"
+
+    return (
+        f"📬 Новое задание на проверку!\n"
+        f"Пользователь: @{db_user.username or 'без username'}\n"
+        f"Тип: {item_type}\n"
+        f"Задание: {item_name}\n"
+        f"ID задания: {assignment.id}"
+    )
+
+async def route_assignment(bot, session, assignment, db_user, exclude=()):
+    """Отправляет задание наименее загруженному проверяющему.
+
+    Если проверяющий недоступен (не запускал бота или заблокировал его),
+    пробуем следующего активного. Возвращает id того, кому задание
+    доставлено, или None.
+    """
+    text = review_text(assignment, db_user)
+    tried = set(exclude)
+
+    while True:
+        # Config.ADMIN_ID тоже в пуле, поэтому отдельного запасного варианта нет:
+        # задание получает только активный проверяющий, который сможет его принять
+        reviewer_id = pick_reviewer(session, db_user.current_course, exclude=tried)
+        if reviewer_id is None:
+            return None
+        tried.add(reviewer_id)
+
+        try:
+            if assignment.media_file_id:
+                # Пересылка по file_id — без повторной загрузки файла
+                await send_media(
+                    bot, reviewer_id, Media(assignment.media_type, assignment.media_file_id, None),
+                    caption=text,
+                    reply_markup=admin_review_keyboard(assignment.id)
+                )
+            else:
+                await bot.send_message(
+                    chat_id=reviewer_id,
+                    text=text,
+                    reply_markup=admin_review_keyboard(assignment.id)
+                )
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Reviewer {reviewer_id} unreachable for assignment {assignment.id}: {str(e)}")
+            continue
+
+        assignment.reviewer_id = reviewer_id
+        session.commit()
+        return reviewer_id
+
+async def submit_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Вызывается ConversationHandler по истечении SUBMIT_TIMEOUT
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="⌛ Время на отправку записи истекло, задание не отправлено.\n"
+             "Нажмите 'Проверить задание' в профиле ещё раз."
+    )
+    logger.info(f"Submission timed out: user={update.effective_user.id}")
+
+async def stale_submit_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Кнопки старого приглашения после таймаута или завершения отправки
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(
+        "⌛ Это окно отправки уже закрыто.\n"
+        "Нажмите 'Проверить задание' в профиле ещё раз."
+    )
+
+async def create_assignment(update, context, reply, media=None):
+    user = update.effective_user
+
+    with Session() as session:
+        db_user = session.query(User).filter_by(id=user.id).first()
+
+        if not db_user:
+            await reply("❌ Пользователь не найден!")
+            return
+
+        if not db_user.current_lesson_id and not db_user.current_song_id:
+            await reply("❌ У вас нет активных заданий!")
+            return
+
+        # Повторная отправка не создаёт второе задание и второе сообщение проверяющему
+        if find_pending_assignment(session, db_user):
+            await reply(ALREADY_PENDING_TEXT)
+            return
+
         # Создание задания на проверку
         assignment = Assignment(
             user_id=user.id,
             type="lesson" if db_user.current_lesson_id else "song",
-            item_id=db_user.current_lesson_id or db_user.current_song_id
+            item_id=db_user.current_lesson_id or db_user.current_song_id,
+            media_type=media.type if media else None,
+            media_file_id=media.file_id if media else None
         )
         session.add(assignment)
         session.commit()
-        logger.info(f"Assignment submitted: id={assignment.id}, user={user.id}")
 
-        # Оповещение админа
+        # Назначение наименее загруженному проверяющему и оповещение
         try:
-            item_type = "урок" if assignment.type == "lesson" else "разбор"
-            if assignment.type == "lesson":
-                item = session.get(Lesson, assignment.item_id)
-            else:
-                item = session.get(Song, assignment.item_id)
-                
-            item_name = item.title if item else "Неизвестное задание"
-
-            await context.bot.send_message(
-                chat_id=Config.ADMIN_ID,
-                text=f"📬 Новое задание на проверку!\n"
-                     f"Пользователь: @{db_user.username or 'без username'}\n"
-                     f"Тип: {item_type}\n"
-                     f"Задание: {item_name}\n"
-                     f"ID задания: {assignment.id}",
-                reply_markup=admin_review_keyboard(assignment.id)
-            )
+            reviewer_id = await route_assignment(context.bot, session, assignment, db_user)
         except Exception as e:
             logger.error(f"Error notifying admin: {str(e)}")
-            await query.edit_message_text("❌ Ошибка при отправке задания администратору!")
+            reviewer_id = None
+
+        logger.info(f"Assignment submitted: id={assignment.id}, user={user.id}, reviewer={reviewer_id}")
+        event_log.emit(
+            "assignment_submitted", user.id,
+            assignment_id=assignment.id, type=assignment.type, item_id=assignment.item_id,
+            reviewer_id=reviewer_id, media_type=assignment.media_type
+        )
+
+        if reviewer_id is None:
+            await reply("❌ Ошибка при отправке задания администратору!")
             return
 
-        await query.edit_message_text(
+        if media and Config.MEDIA_ARCHIVE_DIR:
+            context.application.create_task(archive_media(context.bot, assignment.id, media))
+
+        await reply(
             "✅ Задание отправлено на проверку!\n"
             "Админ проверит его в ближайшее время."
         )
 
-    return ConversationHandler.END
-
 async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
     reward = 0  # Инициализация по умолчанию
 
     try:
         assignment_id = int(query.data.split("_")[1])
     except (IndexError, ValueError):
+        await query.answer()
         await query.edit_message_text("❌ Неверный ID задания!")
         return
 
     with Session() as session:
+        reviewer = get_active_reviewer(session, query.from_user.id)
+        if not reviewer:
+            await query.answer("⛔ У вас нет прав на проверку заданий!", show_alert=True)
+            logger.warning(f"Unauthorized review attempt: user={query.from_user.id}, assignment={assignment_id}")
+            return
+        await query.answer()
+
         assignment = session.get(Assignment, assignment_id)
         if not assignment:
             await query.edit_message_text("❌ Задание не найдено!")
             return
 
+        if not can_review(reviewer, assignment):
+            await query.edit_message_text("❌ Задание назначено другому проверяющему!")
+            return
+
         if assignment.status != "pending":
             await query.edit_message_text("❌ Задание уже обработано!")
             return
@@ -303,6 +467,13 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
             assignment.status = "approved"
             session.commit()
             logger.info(f"Assignment approved: id={assignment_id}, reward={reward}")
+            event_log.emit(
+                "assignment_approved", db_user.id,
+                assignment_id=assignment_id, type=assignment.type, item_id=assignment.item_id,
+                reward=reward, reputation=db_user.reputation, reviewer_id=reviewer.user_id
+            )
+            if rank_changed:
+                event_log.emit("rank_changed", db_user.id, rank=db_user.rank, reputation=db_user.reputation)
 
             # Оповещение пользователя
             try:
@@ -327,20 +498,31 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
 
     try:
         assignment_id = int(query.data.split("_")[1])
     except (IndexError, ValueError):
+        await query.answer()
         await query.edit_message_text("❌ Неверный ID задания!")
         return
 
     with Session() as session:
+        reviewer = get_active_reviewer(session, query.from_user.id)
+        if not reviewer:
+            await query.answer("⛔ У вас нет прав на проверку заданий!", show_alert=True)
+            logger.warning(f"Unauthorized review attempt: user={query.from_user.id}, assignment={assignment_id}")
+            return
+        await query.answer()
+
         assignment = session.get(Assignment, assignment_id)
         if not assignment:
             await query.edit_message_text("❌ Задание не найдено!")
             return
 
+        if not can_review(reviewer, assignment):
+            await query.edit_message_text("❌ Задание назначено другому проверяющему!")
+            return
+
         if assignment.status != "pending":
             await query.edit_message_text("❌ Задание уже обработано!")
             return
@@ -353,6 +535,10 @@ async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
         assignment.status = "rejected"
         session.commit()
         logger.info(f"Assignment rejected: id={assignment_id}")
+        event_log.emit(
+            "assignment_rejected", db_user.id,
+            assignment_id=assignment_id, type=assignment.type, item_id=assignment.item_id, reviewer_id=reviewer.user_id
+        )
 
         # Оповещение пользователя
         try:
@@ -365,3 +551,86 @@ async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("❌ Задание отклонено, но не удалось уведомить пользователя!")
         else:
             await query.edit_message_text("✅ Задание отклонено. Пользователь уведомлен.")
+
+
+async def add_reviewer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /add_reviewer <user_id> [курс] [admin]
+    with Session() as session:
+        caller = get_active_reviewer(session, update.effective_user.id)
+        if not caller or caller.role != "admin":
+            await update.message.reply_text("⛔ Команда доступна только администраторам!")
+            return
+
+        try:
+            user_id = int(context.args[0])
+            course = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else None
+        except (IndexError, ValueError):
+            await update.message.reply_text("Использование: /add_reviewer <user_id> [курс] [admin]")
+            return
+        role = "admin" if "admin" in context.args[1:] else "reviewer"
+
+        # Иначе можно остаться без единого администратора пула
+        if role != "admin" and user_id in (caller.user_id, Config.ADMIN_ID):
+            await update.message.reply_text("❌ Нельзя снять права администратора с себя или с главного администратора!")
+            return
+
+        reviewer = session.get(Reviewer, user_id)
+        if reviewer:
+            reviewer.role = role
+            reviewer.course = course
+            reviewer.is_active = True
+        else:
+            session.add(Reviewer(user_id=user_id, role=role, course=course))
+        session.commit()
+        logger.info(f"Reviewer added: user={user_id}, role={role}, course={course}, by={caller.user_id}")
+
+    await update.message.reply_text(
+        f"✅ Проверяющий {user_id} добавлен ({role}, курс: {course or 'любой'})"
+    )
+
+async def remove_reviewer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /remove_reviewer <user_id> — назначенные ему pending-задания передаются другим проверяющим
+    with Session() as session:
+        caller = get_active_reviewer(session, update.effective_user.id)
+        if not caller or caller.role != "admin":
+            await update.message.reply_text("⛔ Команда доступна только администраторам!")
+            return
+
+        try:
+            user_id = int(context.args[0])
+        except (IndexError, ValueError):
+            await update.message.reply_text("Использование: /remove_reviewer <user_id>")
+            return
+
+        if user_id == caller.user_id:
+            await update.message.reply_text("❌ Нельзя удалить самого себя!")
+            return
+
+        reviewer = session.get(Reviewer, user_id)
+        if not reviewer or not reviewer.is_active:
+            await update.message.reply_text("❌ Проверяющий не найден!")
+            return
+
+        reviewer.is_active = False
+        session.commit()
+        logger.info(f"Reviewer removed: user={user_id}, by={caller.user_id}")
+
+        pending = session.query(Assignment).filter_by(reviewer_id=user_id, status="pending").all()
+        reassigned = 0
+        for assignment in pending:
+            db_user = session.get(User, assignment.user_id)
+            if not db_user:
+                continue
+            try:
+                new_reviewer_id = await route_assignment(context.bot, session, assignment, db_user, exclude={user_id})
+            except Exception as e:
+                logger.error(f"Error reassigning assignment {assignment.id}: {str(e)}")
+                continue
+            if new_reviewer_id is not None:
+                reassigned += 1
+                logger.info(f"Assignment reassigned: id={assignment.id}, {user_id} -> {new_reviewer_id}")
+
+    text = f"✅ Проверяющий {user_id} исключён из пула"
+    if pending:
+        text += f"\nПереназначено заданий: {reassigned} из {len(pending)}"
+    await update.message.reply_text(text)
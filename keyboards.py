@@ -34,6 +34,13 @@ def song_selection_keyboard():
     return InlineKeyboardMarkup(buttons)
 
 
+def media_prompt_keyboard():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("Отправить без записи", callback_data="submit_without_media")],
+        [InlineKeyboardButton("Отмена", callback_data="cancel_submit")]
+    ])
+
+
 def admin_review_keyboard(assignment_id):
     return InlineKeyboardMarkup([
         [
@@ -1,44 +1,91 @@
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ConversationHandler
-from database import init_db
-from handlers import *
-from config import Config
 import logging
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import sys
 import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from config import Config
+
+# Момент старта процесса — для замера времени до первого апдейта
+PROCESS_START = time.perf_counter()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
+
 class HealthCheckHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path == "/metrics":
+            import metrics
+            body = metrics.render().encode()
+        else:
+            body = b"OK"
         self.send_response(200)
         self.end_headers()
-        self.wfile.write(b"OK")
+        self.wfile.write(body)
 
 def run_health_check():
     server = HTTPServer(('0.0.0.0', 8080), HealthCheckHandler)
     server.serve_forever()
 
-def main():
-    health_thread = threading.Thread(target=run_health_check, daemon=True)
-    health_thread.start()
-    # Инициализация базы данных
-    init_db()
+def check_python_version():
+    if sys.version_info >= (3, 13):
+        print("FATAL ERROR: Python 3.13 is not supported")
+        print("Please use Python 3.11")
+        sys.exit(1)
+
+def setup_logging():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    # httpx пишет URL каждого запроса на INFO, а в URL Bot API есть токен
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+async def log_first_update(update, context):
+    # Срабатывает один раз: фиксирует время от старта процесса до первого апдейта
+    if context.bot_data.get("first_update_logged"):
+        return
+    context.bot_data["first_update_logged"] = True
+    logger.info(f"Time to first update: {time.perf_counter() - PROCESS_START:.3f}s")
+
+async def stop_event_log(application):
+    from events import event_log
+    event_log.stop()
+
+def build_application(request=None):
+    # Тяжёлые импорты (telegram, sqlalchemy) — только здесь, а не при импорте модуля
+    from telegram import Update
+    from telegram.ext import (
+        Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, TypeHandler, filters
+    )
+    from middleware import throttle
+    from handlers import (
+        start, profile, start_lesson, submit_assignment, admin_approve, admin_reject,
+        start_song_selection, select_song, add_reviewer, remove_reviewer,
+        receive_media, submit_without_media, cancel_submit, submit_timeout, stale_submit_button,
+        SELECTING_SONG, WAITING_MEDIA
+    )
 
     # Создание приложения
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    builder = Application.builder().token(Config.BOT_TOKEN).post_shutdown(stop_event_log)
+    if request is not None:
+        # Подмена сетевого слоя (используется в bench_startup.py)
+        builder = builder.request(request)
+    application = builder.build()
+
+    application.add_handler(TypeHandler(Update, log_first_update), group=-100)
+
+    # Ограничение частоты и дедупликация нажатий — до любых обращений к БД
+    application.add_handler(TypeHandler(Update, throttle), group=-1)
 
     # Обработчики команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("profile", profile))
+    application.add_handler(CommandHandler("add_reviewer", add_reviewer))
+    application.add_handler(CommandHandler("remove_reviewer", remove_reviewer))
 
     # Обработчики callback-запросов
     application.add_handler(CallbackQueryHandler(start_lesson, pattern="^start_lesson$"))
-    application.add_handler(CallbackQueryHandler(submit_assignment, pattern="^submit_assignment$"))
     application.add_handler(CallbackQueryHandler(admin_approve, pattern="^approve_"))
     application.add_handler(CallbackQueryHandler(admin_reject, pattern="^reject_"))
 
@@ -52,16 +99,60 @@ def main():
     )
     application.add_handler(song_conv_handler)
 
+    # ConversationHandler для отправки задания с записью
+    submit_conv_handler = ConversationHandler(
+        entry_points=[CallbackQueryHandler(submit_assignment, pattern="^submit_assignment$")],
+        states={
+            WAITING_MEDIA: [
+                MessageHandler(filters.UpdateType.MESSAGE & ~filters.COMMAND, receive_media),
+                CallbackQueryHandler(submit_without_media, pattern="^submit_without_media$")
+            ],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, submit_timeout)]
+        },
+        fallbacks=[CallbackQueryHandler(cancel_submit, pattern="^cancel_submit$")],
+        # Повторное нажатие «Проверить задание» начинает отправку заново,
+        # а брошенная отправка закрывается по таймауту
+        allow_reentry=True,
+        conversation_timeout=Config.SUBMIT_TIMEOUT
+    )
+    application.add_handler(submit_conv_handler)
+
+    # Нажатия на кнопки приглашения вне активной отправки (после таймаута)
+    application.add_handler(CallbackQueryHandler(
+        stale_submit_button, pattern="^(submit_without_media|cancel_submit)$"
+    ))
+
+    return application
+
+def bootstrap(request=None):
+    """Подготовка процесса к приёму апдейтов: проверки, логирование, БД, приложение"""
+    check_python_version()
+    setup_logging()
+
+    # Инициализация базы данных
+    from database import init_db
+    init_db()
+
+    # Фоновая запись журнала событий
+    from events import event_log
+    event_log.start()
+
+    application = build_application(request)
+    logger.info(f"Bootstrap finished in {time.perf_counter() - PROCESS_START:.3f}s")
+    return application
+
+def main():
+    health_thread = threading.Thread(target=run_health_check, daemon=True)
+    health_thread.start()
+
+    application = bootstrap()
+
     # Запуск бота
     application.run_polling()
 
 
 if __name__ == "__main__":
     # Запускаем health-check сервер в отдельном потоке
-    import threading
-    from http.server import BaseHTTPRequestHandler, HTTPServer
-
-
     class HealthHandler(BaseHTTPRequestHandler):
         def do_GET(self):
             self.send_response(200)
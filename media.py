@@ -0,0 +1,89 @@
+from collections import namedtuple
+from database import Session, Assignment
+from config import Config
+import metrics
+import httpx
+import logging
+import os
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+Media = namedtuple("Media", ["type", "file_id", "file_size"])
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def extract_media(message):
+    for media_type in ("video", "voice", "document"):
+        attachment = getattr(message, media_type)
+        if attachment:
+            return Media(media_type, attachment.file_id, attachment.file_size)
+    return None
+
+
+async def send_media(bot, chat_id, media, **kwargs):
+    # Telegram принимает file_id вместо файла, повторной загрузки не происходит
+    if media.type == "video":
+        return await bot.send_video(chat_id=chat_id, video=media.file_id, **kwargs)
+    if media.type == "voice":
+        return await bot.send_voice(chat_id=chat_id, voice=media.file_id, **kwargs)
+    return await bot.send_document(chat_id=chat_id, document=media.file_id, **kwargs)
+
+
+async def archive_media(bot, assignment_id, media):
+    """Скачивает запись в MEDIA_ARCHIVE_DIR потоково, кусками по MEDIA_CHUNK_SIZE.
+
+    Файл целиком в памяти не держится; если размер превышает MEDIA_MAX_BYTES
+    (заранее по file_size или уже в процессе загрузки), архивация прерывается.
+    """
+    if media.file_size and media.file_size > Config.MEDIA_MAX_BYTES:
+        metrics.inc("media_archive_skipped")
+        logger.info(f"Media too large to archive: assignment={assignment_id}, size={media.file_size}")
+        return
+
+    tmp_path = None
+    try:
+        tg_file = await bot.get_file(media.file_id)
+        extension = os.path.splitext(tg_file.file_path or "")[1]
+        os.makedirs(Config.MEDIA_ARCHIVE_DIR, exist_ok=True)
+        path = os.path.join(Config.MEDIA_ARCHIVE_DIR, f"{assignment_id}_{media.type}{extension}")
+        tmp_path = path + ".part"
+
+        written = 0
+        async with httpx.AsyncClient(timeout=60) as client:
+            async with client.stream("GET", tg_file.file_path) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(Config.MEDIA_CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > Config.MEDIA_MAX_BYTES:
+                            raise MediaTooLarge(f"file exceeds {Config.MEDIA_MAX_BYTES} bytes")
+                        f.write(chunk)
+        os.replace(tmp_path, path)
+        tmp_path = None
+
+        with Session() as session:
+            assignment = session.get(Assignment, assignment_id)
+            if assignment:
+                assignment.media_path = path
+                session.commit()
+
+        metrics.inc("media_archived")
+        metrics.inc("media_archived_bytes", written)
+        logger.info(f"Media archived: assignment={assignment_id}, path={path}, size={written}")
+    except Exception as e:
+        metrics.inc("media_archive_failed")
+        # Текст ошибок httpx содержит URL файла вместе с токеном бота — его не логируем
+        if isinstance(e, httpx.HTTPStatusError):
+            reason = f"HTTP {e.response.status_code}"
+        elif isinstance(e, MediaTooLarge):
+            reason = str(e)
+        else:
+            reason = type(e).__name__
+        logger.error(f"Error archiving media for assignment {assignment_id}: {reason}")
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,20 @@
+from collections import Counter
+import threading
+
+# Простые счётчики процесса; отдаются health-check сервером по /metrics
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def inc(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def render():
+    return "".join(f"{name} {value}\n" for name, value in sorted(snapshot().items()))
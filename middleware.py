@@ -0,0 +1,105 @@
+from telegram import Update
+from telegram.ext import ContextTypes, ApplicationHandlerStop
+from config import Config
+import metrics
+import logging
+import time
+
+# Настройка логгера
+logger = logging.getLogger(__name__)
+
+# Чистим словари не чаще раза в минуту
+CLEANUP_INTERVAL = 60
+
+
+class TokenBucket:
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def is_full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Корзины токенов по пользователям и дедупликация нажатий (user, callback_data)"""
+
+    def __init__(self, capacity, rate, dedup_window):
+        self.capacity = capacity
+        self.rate = rate
+        self.dedup_window = dedup_window
+        self.buckets = {}
+        self.recent_callbacks = {}
+        self.last_cleanup = time.monotonic()
+
+    def is_duplicate(self, user_id, data, now):
+        key = (user_id, data)
+        last_seen = self.recent_callbacks.get(key)
+        self.recent_callbacks[key] = now
+        return last_seen is not None and now - last_seen < self.dedup_window
+
+    def allow(self, user_id, now):
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(self.capacity, self.rate, now)
+        return bucket.consume(now)
+
+    def cleanup(self, now):
+        if now - self.last_cleanup < CLEANUP_INTERVAL:
+            return
+        self.last_cleanup = now
+        self.buckets = {uid: b for uid, b in self.buckets.items() if not b.is_full(now)}
+        self.recent_callbacks = {
+            key: seen for key, seen in self.recent_callbacks.items()
+            if now - seen < self.dedup_window
+        }
+
+
+rate_limiter = RateLimiter(
+    Config.RATE_LIMIT_BURST,
+    Config.RATE_LIMIT_PER_SECOND,
+    Config.CALLBACK_DEDUP_WINDOW
+)
+
+
+async def answer_quietly(query, text):
+    # Ошибка ответа (например, устаревший query) не должна пропустить апдейт дальше
+    try:
+        await query.answer(text)
+    except Exception as e:
+        logger.warning(f"Error answering throttled callback: {type(e).__name__}")
+
+
+async def throttle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Выполняется до всех обработчиков (group=-1); при отказе обработка апдейта прерывается
+    user = update.effective_user
+    if not user:
+        return
+
+    now = time.monotonic()
+    rate_limiter.cleanup(now)
+    metrics.inc("updates_total")
+    query = update.callback_query
+
+    if query and rate_limiter.is_duplicate(user.id, query.data, now):
+        metrics.inc("updates_deduplicated")
+        logger.info(f"Duplicate callback dropped: user={user.id}, data={query.data}")
+        await answer_quietly(query, "⏳ Уже обрабатываем, подождите...")
+        raise ApplicationHandlerStop
+
+    if not rate_limiter.allow(user.id, now):
+        metrics.inc("updates_rate_limited")
+        logger.info(f"Rate limit hit: user={user.id}")
+        if query:
+            await answer_quietly(query, "⏳ Слишком часто! Подождите немного.")
+        raise ApplicationHandlerStop
@@ -0,0 +1,157 @@
+"""Восстановление прогресса и репутации пользователей из журнала событий.
+
+По умолчанию сверяет состояние, построенное по событиям, с таблицей users
+и завершается с кодом 1 при расхождениях. С --apply записывает
+восстановленное состояние в БД (пользователи, пройденные уроки и разборы).
+
+Полная история есть только у пользователей с событием user_created —
+остальные (созданные до появления журнала) пропускаются.
+
+    python replay_events.py [--user ID] [--apply]
+"""
+import argparse
+import json
+import logging
+import sys
+
+from config import Config
+from database import Session, User, Lesson, Event, CompletedLesson, CompletedSong, get_engine
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayedUser:
+    def __init__(self, user_id, username=None, full_name=None):
+        self.id = user_id
+        self.username = username
+        self.full_name = full_name
+        self.reputation = 0
+        self.rank = 'Новичок'
+        self.current_course = 1
+        self.progress = 0.0
+        self.current_lesson_id = None
+        self.current_song_id = None
+        self.completed_lessons = set()
+        self.completed_songs = set()
+
+    # Та же логика, что и в User.update_rank
+    update_rank = User.update_rank
+
+
+def replay(session, user_id=None):
+    lessons_per_course = {}
+    for course, in session.query(Lesson.course):
+        lessons_per_course[course] = lessons_per_course.get(course, 0) + 1
+
+    users = {}
+    query = session.query(Event).order_by(Event.id)
+    if user_id is not None:
+        query = query.filter(Event.user_id == user_id)
+
+    for event in query.yield_per(1000):
+        payload = json.loads(event.payload or "{}")
+
+        if event.type == "user_created":
+            users[event.user_id] = ReplayedUser(event.user_id, payload.get("username"), payload.get("full_name"))
+            continue
+
+        state = users.get(event.user_id)
+        if state is None:
+            continue
+
+        if event.type == "lesson_started":
+            state.current_lesson_id = payload["lesson_id"]
+        elif event.type == "song_started":
+            state.current_song_id = payload["song_id"]
+        elif event.type == "assignment_approved":
+            if payload["type"] == "lesson":
+                state.completed_lessons.add(payload["item_id"])
+                state.current_lesson_id = None
+            else:
+                state.completed_songs.add(payload["item_id"])
+                state.current_song_id = None
+            state.reputation += payload["reward"]
+            state.update_rank(Config)
+            total = lessons_per_course.get(state.current_course, 0)
+            state.progress = (len(state.completed_lessons) / total) * 100 if total > 0 else 0
+
+    return users
+
+
+FIELDS = ("reputation", "rank", "current_course", "current_lesson_id", "current_song_id")
+
+
+def verify(session, users):
+    mismatches = 0
+    for state in users.values():
+        db_user = session.get(User, state.id)
+        if db_user is None:
+            print(f"user {state.id}: отсутствует в БД")
+            mismatches += 1
+            continue
+
+        diffs = [
+            f"{field}: БД={getattr(db_user, field)!r}, журнал={getattr(state, field)!r}"
+            for field in FIELDS if getattr(db_user, field) != getattr(state, field)
+        ]
+        if abs((db_user.progress or 0) - state.progress) > 0.01:
+            diffs.append(f"progress: БД={db_user.progress!r}, журнал={state.progress!r}")
+
+        completed_lessons = {cl.lesson_id for cl in db_user.completed_lessons}
+        completed_songs = {cs.song_id for cs in db_user.completed_songs}
+        if completed_lessons != state.completed_lessons:
+            diffs.append(f"completed_lessons: БД={sorted(completed_lessons)}, журнал={sorted(state.completed_lessons)}")
+        if completed_songs != state.completed_songs:
+            diffs.append(f"completed_songs: БД={sorted(completed_songs)}, журнал={sorted(state.completed_songs)}")
+
+        if diffs:
+            mismatches += 1
+            print(f"user {state.id}:")
+            for diff in diffs:
+                print(f"  {diff}")
+
+    print(f"Проверено пользователей: {len(users)}, с расхождениями: {mismatches}")
+    return mismatches
+
+
+def apply(session, users):
+    for state in users.values():
+        db_user = session.get(User, state.id)
+        if db_user is None:
+            db_user = User(id=state.id, username=state.username, full_name=state.full_name)
+            session.add(db_user)
+
+        for field in FIELDS + ("progress",):
+            setattr(db_user, field, getattr(state, field))
+
+        session.query(CompletedLesson).filter_by(user_id=state.id).delete()
+        session.query(CompletedSong).filter_by(user_id=state.id).delete()
+        session.add_all(CompletedLesson(user_id=state.id, lesson_id=lesson_id) for lesson_id in state.completed_lessons)
+        session.add_all(CompletedSong(user_id=state.id, song_id=song_id) for song_id in state.completed_songs)
+
+    session.commit()
+    print(f"Восстановлено пользователей: {len(users)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Восстановление состояния пользователей из журнала событий")
+    parser.add_argument("--user", type=int, default=None, help="только указанный пользователь")
+    parser.add_argument("--apply", action="store_true", help="записать восстановленное состояние в БД")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    get_engine()
+
+    with Session() as session:
+        users = replay(session, args.user)
+        if args.apply:
+            apply(session, users)
+            return 0
+        return 1 if verify(session, users) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())